@@ -1,4 +1,6 @@
+import threading
 from collections import deque
+from uuid import uuid4
 from typing import Dict, List, Optional
 from models.Mision import Mision
 
@@ -12,13 +14,19 @@ class PersonajeMisionQueue:
         if cls._instance is None:
             cls._instance = super(PersonajeMisionQueue, cls).__new__(cls)
             cls._instance.queues = {}  # Dict[int, deque]
+            # Las colas viven en memoria: el epoch distingue las de cada arranque en los ETags
+            cls._instance.epoch = uuid4().hex[:8]
+            # Las rutas se ejecutan en el threadpool: protege la creación de colas nuevas
+            cls._instance._lock = threading.Lock()
         return cls._instance
     
     def get_queue(self, personaje_id: int) -> deque:
         """Obtiene la cola de misiones para un personaje específico"""
-        if personaje_id not in self.queues:
-            self.queues[personaje_id] = deque()
-        return self.queues[personaje_id]
+        queue = self.queues.get(personaje_id)
+        if queue is None:
+            with self._lock:
+                queue = self.queues.setdefault(personaje_id, deque())
+        return queue
     
     def enqueue(self, personaje_id: int, mision: Mision) -> None:
         """Añade una misión a la cola de un personaje"""
@@ -27,17 +35,18 @@ class PersonajeMisionQueue:
     
     def dequeue(self, personaje_id: int) -> Optional[Mision]:
         """Obtiene la siguiente misión pendiente para un personaje"""
-        queue = self.get_queue(personaje_id)
-        if len(queue) == 0:
+        # popleft es atómico; comprobar antes la longitud no lo sería
+        try:
+            return self.get_queue(personaje_id).popleft()
+        except IndexError:
             return None
-        return queue.popleft()
     
     def peek(self, personaje_id: int) -> Optional[Mision]:
         """Ver la siguiente misión sin sacarla de la cola"""
-        queue = self.get_queue(personaje_id)
-        if len(queue) == 0:
+        try:
+            return self.get_queue(personaje_id)[0]
+        except IndexError:
             return None
-        return queue[0]
     
     def get_all(self, personaje_id: int) -> List[Mision]:
         """Obtiene todas las misiones en la cola de un personaje"""
@@ -53,4 +62,4 @@ class PersonajeMisionQueue:
     
     def clear(self, personaje_id: int) -> None:
         """Vacía la cola de un personaje"""
-        self.queues[personaje_id] = deque()
+        self.get_queue(personaje_id).clear()
@@ -0,0 +1,93 @@
+"""
+Mide el coste fijo por petición de la API, llamando a la aplicación ASGI
+directamente (sin servidor ni cliente HTTP) sobre una base de datos temporal.
+
+Uso:
+    python benchmarks/request_overhead.py [peticiones]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+async def call(app, method: str, path: str, headers=None, query: str = "", body: bytes = b""):
+    """Ejecuta una petición contra la aplicación y devuelve el código de estado"""
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": ("bench", 1),
+        "server": ("bench", 80),
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.sleep(3600)
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    response = {}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = dict(message["headers"])
+
+    await app(scope, receive, send)
+    return response
+
+async def bench(app, label: str, requests: int, method: str, path: str, headers=None, query: str = "",
+                rounds: int = 5):
+    """Repite el escenario varias veces y muestra la mejor media (la menos afectada por ruido)"""
+    for _ in range(50):
+        await call(app, method, path, headers, query)
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(requests):
+            await call(app, method, path, headers, query)
+        best = min(best, (time.perf_counter() - start) / requests)
+    print(f"{label:<45} {best * 1e6:8.1f} µs/petición")
+
+async def main(requests: int):
+    sys.path.insert(0, ROOT)
+    os.chdir(tempfile.mkdtemp())
+
+    import main as api
+    from database import init_db
+    init_db()
+    app = api.app
+
+    json_headers = {"content-type": "application/json"}
+    await call(app, "POST", "/personajes/", json_headers, body=b'{"nombre": "Bench", "clase": "mago"}')
+    for i in range(20):
+        await call(app, "POST", "/personajes/", json_headers, body=b'{"nombre": "Extra", "clase": "mago"}')
+    await call(app, "POST", "/misiones/", json_headers,
+               body=b'{"nombre": "Bench", "descripcion": "Mision de benchmark", "experiencia": 10}')
+    await call(app, "POST", "/personajes/1/misiones/1")
+    await call(app, "POST", "/personajes/1/completar", {"idempotency-key": "bench"})
+    etag = (await call(app, "GET", "/personajes/1"))["headers"][b"etag"].decode()
+
+    print(f"{requests} peticiones por ronda, mejor de 5 rondas")
+    await bench(app, "GET /personajes/1 (304 con If-None-Match)", requests,
+                "GET", "/personajes/1", {"if-none-match": etag})
+    await bench(app, "POST /personajes/1/completar (reintento)", requests,
+                "POST", "/personajes/1/completar", {"idempotency-key": "bench"})
+    await bench(app, "GET /personajes/1", requests, "GET", "/personajes/1")
+    await bench(app, "GET /personajes?fields=id&limit=10", requests,
+                "GET", "/personajes/", query="fields=id&limit=10")
+    await bench(app, "GET /misiones/abc (422, sin acceso a datos)", requests, "GET", "/misiones/abc")
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
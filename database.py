@@ -1,26 +1,146 @@
-from sqlalchemy import create_engine
+import os
+import threading
+import time
+from itertools import count
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
+from starlette.concurrency import run_in_threadpool
 from contextlib import contextmanager
+from typing import Dict, List, Optional
 
 DATABASE_URL = 'sqlite:///RPG.db'
 
+# Sharding opcional: con RPG_SHARD_COUNT > 1 los personajes (y sus filas de
+# mision_personaje) se reparten entre varios ficheros SQLite según su id.
+# Las misiones permanecen en la base principal, que actúa como catálogo.
+SHARD_COUNT = max(1, int(os.getenv('RPG_SHARD_COUNT', '1')))
+SHARD_URL_TEMPLATE = os.getenv('RPG_SHARD_URL', 'sqlite:///RPG_shard{}.db')
+
 # Crear el engine de la base de datos
 engine = create_engine(DATABASE_URL)
 
 # Crear una clase Session configurada
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engines y sesiones de cada shard, creados al usarse por primera vez
+# (sin sharding, el único shard es la base principal)
+_shard_engines: Dict[int, Engine] = {} if SHARD_COUNT > 1 else {0: engine}
+_shard_sessions: Dict[int, sessionmaker] = {} if SHARD_COUNT > 1 else {0: SessionLocal}
+_shard_lock = threading.Lock()
+
+def _shard_tables() -> list:
+    """Los shards solo guardan personajes y sus asignaciones"""
+    from models.Personaje import Personaje
+    from models.MisionPersonaje import MisionPersonaje
+    return [Personaje.__table__, MisionPersonaje.__table__]
+
+def get_shard_engine(shard: int) -> Engine:
+    """
+    Devuelve el engine de un shard. La primera vez lo crea y aplica sus
+    migraciones pendientes, de modo que el arranque no depende del número de shards.
+    """
+    if shard not in _shard_engines:
+        with _shard_lock:
+            if shard not in _shard_engines:
+                shard_engine = create_engine(SHARD_URL_TEMPLATE.format(shard))
+                _migrate(shard_engine, _shard_tables())
+                _shard_engines[shard] = shard_engine
+    return _shard_engines[shard]
+
+def _shard_sessionmaker(shard: int) -> sessionmaker:
+    if shard not in _shard_sessions:
+        _shard_sessions[shard] = sessionmaker(autocommit=False, autoflush=False, bind=get_shard_engine(shard))
+    return _shard_sessions[shard]
+
 # Crear la base para los modelos declarativos
 Base = declarative_base()
 
-def get_db(): #-> Session
-    """Dependencia para proporcionar una sesión de base de datos"""
-    db = SessionLocal()
+# Reparto round-robin de los personajes nuevos entre shards
+_next_shard = count()
+
+def shard_for(personaje_id: int) -> int:
+    """Devuelve el índice del shard que almacena a un personaje"""
+    return (personaje_id - 1) % SHARD_COUNT
+
+class ShardRouter:
+    """
+    Enruta las sesiones de base de datos por personaje_id.
+
+    Todas las sesiones, incluida la del catálogo (misiones), se abren al usarse
+    por primera vez y se reutilizan durante toda la petición: una petición que
+    no llega a tocar la base de datos no crea ninguna.
+    """
+    def __init__(self, catalog: Optional[Session] = None):
+        self._catalog = catalog
+        self._sessions: Dict[int, Session] = {}
+
+    @property
+    def catalog(self) -> Session:
+        """Sesión de la base principal (catálogo de misiones)"""
+        if self._catalog is None:
+            self._catalog = SessionLocal()
+        return self._catalog
+
+    @property
+    def opened(self) -> bool:
+        """Indica si la petición llegó a abrir alguna sesión"""
+        return self._catalog is not None or bool(self._sessions)
+
+    @property
+    def sharded(self) -> bool:
+        return SHARD_COUNT > 1
+
+    @property
+    def shard_count(self) -> int:
+        return SHARD_COUNT
+
+    def session_for_shard(self, shard: int) -> Session:
+        """Obtiene la sesión de un shard concreto"""
+        if not self.sharded:
+            return self.catalog
+        if shard not in self._sessions:
+            self._sessions[shard] = _shard_sessionmaker(shard)()
+        return self._sessions[shard]
+
+    def session_for(self, personaje_id: int) -> Session:
+        """Obtiene la sesión del shard donde vive un personaje"""
+        return self.session_for_shard(shard_for(personaje_id))
+
+    def all_sessions(self) -> List[Session]:
+        """Sesiones de todos los shards, en orden (para scatter-gather)"""
+        return [self.session_for_shard(i) for i in range(SHARD_COUNT)]
+
+    def pick_shard(self) -> int:
+        """Elige el shard en el que se creará un nuevo personaje"""
+        return next(_next_shard) % SHARD_COUNT
+
+    def close(self) -> None:
+        """Cierra las sesiones abiertas de los shards y la del catálogo"""
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
+        if self._catalog is not None:
+            self._catalog.close()
+            self._catalog = None
+
+async def get_shard_router():
+    """
+    Dependencia para proporcionar un ShardRouter con sesiones perezosas.
+
+    Es asíncrona porque crear el router no abre ninguna sesión: así FastAPI no
+    necesita pasar por el threadpool para resolverla. El cierre sí bloquea
+    (Session.close() hace rollback y devuelve la conexión al pool), por lo que
+    solo se hace, en el threadpool, si la petición abrió alguna sesión.
+    """
+    router = ShardRouter()
     try:
-        yield db
+        yield router
     finally:
-        db.close()
+        if router.opened:
+            await run_in_threadpool(router.close)
 
 @contextmanager
 def session_scope():
@@ -35,12 +155,80 @@ def session_scope():
     finally:
         session.close()
 
+def _column_names(conn, table_name: str) -> set:
+    return {column["name"] for column in inspect(conn).get_columns(table_name)}
+
+def _add_version_column(conn, table_name: str) -> None:
+    """Añade la columna version a una tabla creada antes de que existiera (create_all no altera tablas)"""
+    if "version" not in _column_names(conn, table_name):
+        conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+def _create_tables(conn, tables) -> None:
+    Base.metadata.create_all(bind=conn, tables=tables)
+
+def _add_version_columns(conn, tables) -> None:
+    for table in tables:
+        if "version" in table.c:
+            _add_version_column(conn, table.name)
+
+def _add_uid_columns(conn, tables) -> None:
+    """Añade la columna uid y asigna uno aleatorio a cada fila existente"""
+    for table in tables:
+        if "uid" in table.c and "uid" not in _column_names(conn, table.name):
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN uid VARCHAR(32)"))
+            conn.execute(text(f"UPDATE {table.name} SET uid = lower(hex(randomblob(16)))"))
+
+# Migraciones ordenadas (versión, función). Cada una recibe la conexión con la
+# transacción de la migración y debe ser idempotente, ya que en bases anteriores
+# al versionado del esquema se aplican todas.
+# Para cambiar el esquema se añade una entrada nueva al final; nunca se editan las existentes.
+MIGRATIONS = [
+    (1, _create_tables),
+    (2, _add_version_columns),
+    (3, _add_uid_columns),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def _read_schema_version(conn) -> int:
+    """Lee la versión del esquema con una única consulta (0 si la base no está versionada)"""
+    try:
+        return conn.execute(text("SELECT version FROM schema_version")).scalar() or 0
+    except OperationalError:
+        return 0
+
+def _migrate(bind, tables) -> int:
+    """Aplica las migraciones pendientes sobre una base y devuelve cuántas se aplicaron"""
+    with bind.connect() as conn:
+        if _read_schema_version(conn) >= SCHEMA_VERSION:
+            return 0
+        
+        # Varios procesos pueden arrancar a la vez sobre la misma base: se toma el
+        # bloqueo de escritura de SQLite y se vuelve a leer la versión dentro de él.
+        # Las migraciones y la nueva versión se confirman en esa misma transacción,
+        # así que el resto de procesos esperan y después no encuentran nada pendiente.
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        current = _read_schema_version(conn)
+        pending = [migration for version, migration in MIGRATIONS if version > current]
+        for migration in pending:
+            migration(conn, tables)
+        if pending:
+            conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+            conn.execute(text("DELETE FROM schema_version"))
+            conn.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": SCHEMA_VERSION})
+        conn.commit()
+    return len(pending)
+
 def init_db():
-    """Inicializa la base de datos creando todas las tablas definidas"""
+    """
+    Inicializa la base principal aplicando solo las migraciones pendientes.
+    Los shards se migran al usarse por primera vez (ver get_shard_engine).
+    """
     # Importamos los modelos aquí para asegurar que estén registrados
     from models.Personaje import Personaje
     from models.Mision import Mision
     from models.MisionPersonaje import MisionPersonaje
     
-    Base.metadata.create_all(bind=engine)
-    print("Base de datos inicializada")
\ No newline at end of file
+    start = time.perf_counter()
+    applied = _migrate(engine, Base.metadata.sorted_tables)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"Base de datos inicializada (esquema v{SCHEMA_VERSION}, {applied} migraciones aplicadas, {elapsed:.1f} ms)")
@@ -29,3 +29,6 @@ class MisionResponse(MisionBase):
     
     class Config:
         from_attributes = True
+
+# Campos que se pueden seleccionar con ?fields= (en el orden de MisionResponse)
+MISION_FIELDS = tuple(MisionResponse.model_fields)
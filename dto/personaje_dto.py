@@ -21,3 +21,6 @@ class PersonajeResponse(PersonajeBase):
     
     class Config:
         from_attributes = True
+
+# Campos que se pueden seleccionar con ?fields= (en el orden de PersonajeResponse)
+PERSONAJE_FIELDS = tuple(PersonajeResponse.model_fields)
@@ -1,4 +1,10 @@
+import time
+
+# Referencia para medir el tiempo total de arranque (imports incluidos)
+_boot_start = time.perf_counter()
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
@@ -11,6 +17,7 @@ app = FastAPI(
     title="Sistema de Misiones RPG",
     description="API para gestionar personajes y misiones de un juego RPG con sistema FIFO",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     openapi_tags=[
         {"name": "Root", "description": "Endpoint principal"},
         {"name": "Personajes", "description": "Operaciones con personajes"},
@@ -35,7 +42,8 @@ app.include_router(mision_router)
 @app.on_event("startup")
 def startup_event():
     init_db()
-    print("Base de datos inicializada correctamente.")
+    elapsed = (time.perf_counter() - _boot_start) * 1000
+    print(f"Aplicación lista en {elapsed:.1f} ms")
 
 @app.get("/", tags=["Root"])
 async def root():
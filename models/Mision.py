@@ -2,6 +2,7 @@ from sqlalchemy import Column, Integer, String, Enum, DateTime
 from sqlalchemy.sql import func
 from database import Base
 from sqlalchemy.orm import relationship
+from uuid import uuid4
 
 
 class Mision(Base):
@@ -12,6 +13,10 @@ class Mision(Base):
     experiencia = Column(Integer, nullable=False)
     estado = Column(Enum('pendiente', 'en_progreso', 'completada', name='estado_mision'), nullable=False)
     fecha_inicio = Column(DateTime, server_default=func.now(), nullable=False)
+    # Se incrementa en cada escritura; base de los ETags
+    version = Column(Integer, nullable=False, default=1, server_default='1')
+    # Único por fila y nunca reutilizado (los ids sí pueden repetirse tras un borrado)
+    uid = Column(String(32), nullable=False, default=lambda: uuid4().hex)
     
     mision_personaje = relationship("MisionPersonaje", back_populates="mision")
 
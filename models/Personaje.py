@@ -1,5 +1,6 @@
 from sqlalchemy import Column, Integer, String, ForeignKey, Enum, DateTime
 from sqlalchemy.orm import relationship
+from uuid import uuid4
 from database import Base
 
 class Personaje(Base):
@@ -9,6 +10,10 @@ class Personaje(Base):
     nivel = Column(Integer, default=1)
     clase = Column(String(50), nullable=False)
     experiencia = Column(Integer, default=0)
+    # Se incrementa en cada escritura (incluidos cambios de su cola); base de los ETags
+    version = Column(Integer, nullable=False, default=1, server_default='1')
+    # Único por fila y nunca reutilizado (los ids sí pueden repetirse tras un borrado)
+    uid = Column(String(32), nullable=False, default=lambda: uuid4().hex)
     
     mision_personaje = relationship("MisionPersonaje", back_populates="personaje")
 
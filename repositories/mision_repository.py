@@ -1,63 +1,97 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple
+from database import ShardRouter
 from models.Mision import Mision
 from models.MisionPersonaje import MisionPersonaje
 from dto.mision_dto import MisionCreate, MisionUpdate, EstadoMision
 
 class MisionRepository:
-    def __init__(self, db: Session):
-        self.db = db
+    """Repositorio sin estado: cada método recibe el ShardRouter de la petición"""
     
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[Mision]:
-        return self.db.query(Mision).offset(skip).limit(limit).all()
+    def get_all_rows(self, shards: ShardRouter, skip: int = 0, limit: int = 100, fields: Sequence[str] = ()) -> List[Tuple]:
+        """Obtiene solo las columnas indicadas de las misiones, como tuplas"""
+        columns = [getattr(Mision, field) for field in fields]
+        return shards.catalog.query(*columns).offset(skip).limit(limit).all()
     
-    def get_by_id(self, mision_id: int) -> Optional[Mision]:
-        return self.db.query(Mision).filter(Mision.id == mision_id).first()
+    def get_by_id(self, shards: ShardRouter, mision_id: int) -> Optional[Mision]:
+        return shards.catalog.query(Mision).filter(Mision.id == mision_id).first()
     
-    def get_by_estado(self, estado: EstadoMision) -> List[Mision]:
-        return self.db.query(Mision).filter(Mision.estado == estado).all()
+    def get_revision(self, shards: ShardRouter, mision_id: int) -> Optional[Tuple[str, int]]:
+        """Obtiene solo el uid y la versión de una misión (None si no existe)"""
+        return shards.catalog.query(Mision.uid, Mision.version).filter(Mision.id == mision_id).first()
     
-    def create(self, mision: MisionCreate) -> Mision:
+    def get_by_estado(self, shards: ShardRouter, estado: EstadoMision) -> List[Mision]:
+        return shards.catalog.query(Mision).filter(Mision.estado == estado).all()
+    
+    def create(self, shards: ShardRouter, mision: MisionCreate) -> Mision:
         db_mision = Mision(**mision.model_dump(), estado="pendiente")
-        self.db.add(db_mision)
-        self.db.commit()
-        self.db.refresh(db_mision)
+        shards.catalog.add(db_mision)
+        shards.catalog.commit()
+        shards.catalog.refresh(db_mision)
         return db_mision
     
-    def update(self, mision_id: int, mision_data: dict) -> Optional[Mision]:
-        db_mision = self.get_by_id(mision_id)
+    def update(self, shards: ShardRouter, mision_id: int, mision_data: dict) -> Optional[Mision]:
+        db_mision = self.get_by_id(shards, mision_id)
         if db_mision is None:
             return None
         
         for key, value in mision_data.items():
             setattr(db_mision, key, value)
+        db_mision.version = Mision.version + 1
         
-        self.db.commit()
-        self.db.refresh(db_mision)
+        shards.catalog.commit()
+        shards.catalog.refresh(db_mision)
         return db_mision
     
-    def delete(self, mision_id: int) -> bool:
-        db_mision = self.get_by_id(mision_id)
+    def start_if_pending(self, shards: ShardRouter, mision_id: int) -> Optional[Mision]:
+        """
+        Pasa una misión de pendiente a en progreso con un UPDATE condicional, de modo
+        que entre peticiones simultáneas solo una puede aceptarla.
+        Devuelve la misión ya actualizada y separada de la sesión (para poder encolarla),
+        o None si no existe o ya no estaba pendiente.
+        """
+        session = shards.catalog
+        claimed = session.query(Mision).filter(
+            Mision.id == mision_id,
+            Mision.estado == EstadoMision.PENDIENTE
+        ).update(
+            {Mision.estado: EstadoMision.EN_PROGRESO, Mision.version: Mision.version + 1},
+            synchronize_session=False
+        )
+        session.commit()
+        if claimed != 1:
+            return None
+        
+        mision = session.query(Mision).filter(Mision.id == mision_id).populate_existing().one()
+        session.expunge(mision)
+        return mision
+    
+    def delete(self, shards: ShardRouter, mision_id: int) -> bool:
+        db_mision = self.get_by_id(shards, mision_id)
         if db_mision is None:
             return False
         
-        self.db.delete(db_mision)
-        self.db.commit()
+        shards.catalog.delete(db_mision)
+        shards.catalog.commit()
         return True
     
-    def asignar_personaje(self, mision_id: int, personaje_id: int) -> Optional[MisionPersonaje]:
+    def asignar_personaje(self, shards: ShardRouter, mision_id: int, personaje_id: int) -> Optional[MisionPersonaje]:
+        # Las asignaciones viven en el shard del personaje
+        session = shards.session_for(personaje_id)
+        
         # Verificar si ya existe la asignación
-        existing = self.db.query(MisionPersonaje).filter(
+        existing = session.query(MisionPersonaje).filter(
             MisionPersonaje.mision_id == mision_id,
             MisionPersonaje.personaje_id == personaje_id
         ).first()
         
         if existing:
+            # Confirma igualmente lo pendiente en la sesión del shard (p. ej. la versión del personaje)
+            session.commit()
             return existing
         
         # Crear nueva asignación
         asignacion = MisionPersonaje(mision_id=mision_id, personaje_id=personaje_id)
-        self.db.add(asignacion)
-        self.db.commit()
-        self.db.refresh(asignacion)
+        session.add(asignacion)
+        session.commit()
+        session.refresh(asignacion)
         return asignacion
@@ -1,51 +1,107 @@
-from sqlalchemy.orm import Session, joinedload
-from typing import List, Optional
+from heapq import merge
+from itertools import islice
+from sqlalchemy import func, insert, literal, select
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import List, Optional, Sequence, Tuple
+from database import ShardRouter
 from models.Personaje import Personaje
+from models.Mision import Mision
 from models.MisionPersonaje import MisionPersonaje
 from dto.personaje_dto import PersonajeCreate, PersonajeUpdate
 
 class PersonajeRepository:
-    def __init__(self, db: Session):
-        self.db = db
+    """Repositorio sin estado: cada método recibe el ShardRouter de la petición"""
     
-    def get_all(self, skip: int = 0, limit: int = 100) -> List[Personaje]:
-        return self.db.query(Personaje).offset(skip).limit(limit).all()
+    def get_all_rows(self, shards: ShardRouter, skip: int = 0, limit: int = 100, fields: Sequence[str] = ()) -> List[Tuple]:
+        """Obtiene solo las columnas indicadas de los personajes, como tuplas"""
+        columns = [getattr(Personaje, field) for field in fields]
+        if not shards.sharded:
+            return shards.catalog.query(*columns).offset(skip).limit(limit).all()
+        
+        # El id se antepone para poder mezclar los resultados de cada shard
+        partials = [
+            session.query(Personaje.id, *columns).order_by(Personaje.id).limit(skip + limit).all()
+            for session in shards.all_sessions()
+        ]
+        merged = merge(*partials, key=lambda row: row[0])
+        return [tuple(row[1:]) for row in islice(merged, skip, skip + limit)]
     
-    def get_by_id(self, personaje_id: int) -> Optional[Personaje]:
-        return self.db.query(Personaje).filter(Personaje.id == personaje_id).first()
+    def get_by_id(self, shards: ShardRouter, personaje_id: int) -> Optional[Personaje]:
+        return shards.session_for(personaje_id).query(Personaje).filter(Personaje.id == personaje_id).first()
     
-    def create(self, personaje: PersonajeCreate) -> Personaje:
-        db_personaje = Personaje(**personaje.model_dump())
-        self.db.add(db_personaje)
-        self.db.commit()
-        self.db.refresh(db_personaje)
-        return db_personaje
+    def get_revision(self, shards: ShardRouter, personaje_id: int) -> Optional[Tuple[str, int]]:
+        """Obtiene solo el uid y la versión de un personaje (None si no existe)"""
+        return shards.session_for(personaje_id).query(Personaje.uid, Personaje.version).filter(
+            Personaje.id == personaje_id
+        ).first()
+    
+    def touch(self, shards: ShardRouter, personaje_id: int, commit: bool = True) -> None:
+        """
+        Incrementa la versión de un personaje sin modificar sus datos (p. ej. al cambiar su cola).
+        Con commit=False el cambio queda en la transacción del shard y lo confirma la siguiente escritura.
+        """
+        session = shards.session_for(personaje_id)
+        session.query(Personaje).filter(Personaje.id == personaje_id).update(
+            {Personaje.version: Personaje.version + 1}, synchronize_session=False
+        )
+        if commit:
+            session.commit()
     
-    def update(self, personaje_id: int, personaje: PersonajeUpdate) -> Optional[Personaje]:
-        db_personaje = self.get_by_id(personaje_id)
+    def create(self, shards: ShardRouter, personaje: PersonajeCreate) -> Personaje:
+        if not shards.sharded:
+            db_personaje = Personaje(**personaje.model_dump())
+            shards.catalog.add(db_personaje)
+            shards.catalog.commit()
+            shards.catalog.refresh(db_personaje)
+            return db_personaje
+        
+        # Los ids se intercalan entre shards (id ≡ shard + 1 mód N) para que
+        # shard_for() pueda localizar a cada personaje sin consultar el catálogo.
+        # El id se calcula dentro del propio INSERT: SQLite ejecuta la sentencia
+        # con el fichero bloqueado para escritura, así que dos peticiones (aunque
+        # sean de procesos distintos) nunca obtienen el mismo id en un shard.
+        shard = shards.pick_shard()
+        session = shards.session_for_shard(shard)
+        data = personaje.model_dump()
+        next_id = func.coalesce(func.max(Personaje.id), shard + 1 - shards.shard_count) + shards.shard_count
+        result = session.execute(
+            insert(Personaje).from_select(
+                ["id", *data],
+                select(next_id, *(literal(value) for value in data.values()))
+            )
+        )
+        session.commit()
+        return session.get(Personaje, result.lastrowid)
+    
+    def update(self, shards: ShardRouter, personaje_id: int, personaje: PersonajeUpdate) -> Optional[Personaje]:
+        db_personaje = self.get_by_id(shards, personaje_id)
         if db_personaje is None:
             return None
         
         update_data = personaje.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_personaje, key, value)
+        db_personaje.version = Personaje.version + 1
         
-        self.db.commit()
-        self.db.refresh(db_personaje)
+        session = shards.session_for(personaje_id)
+        session.commit()
+        session.refresh(db_personaje)
         return db_personaje
     
-    def delete(self, personaje_id: int) -> bool:
-        db_personaje = self.get_by_id(personaje_id)
+    def delete(self, shards: ShardRouter, personaje_id: int) -> bool:
+        db_personaje = self.get_by_id(shards, personaje_id)
         if db_personaje is None:
             return False
         
-        self.db.delete(db_personaje)
-        self.db.commit()
+        session = shards.session_for(personaje_id)
+        session.delete(db_personaje)
+        session.commit()
         return True
     
-    def add_experience(self, personaje_id: int, experience: int) -> Optional[Personaje]:
+    def add_experience(self, shards: ShardRouter, personaje_id: int, experience: int) -> Optional[Personaje]:
         """Añade experiencia a un personaje y sube de nivel si corresponde"""
-        db_personaje = self.get_by_id(personaje_id)
+        db_personaje = self.get_by_id(shards, personaje_id)
         if db_personaje is None:
             return None
         
@@ -56,13 +112,28 @@ class PersonajeRepository:
         new_level = db_personaje.experiencia // 100 + 1
         if new_level > db_personaje.nivel:
             db_personaje.nivel = new_level
+        db_personaje.version = Personaje.version + 1
         
-        self.db.commit()
-        self.db.refresh(db_personaje)
+        session = shards.session_for(personaje_id)
+        session.commit()
+        session.refresh(db_personaje)
         return db_personaje
     
-    def get_misiones(self, personaje_id: int) -> List[MisionPersonaje]:
+    def get_misiones(self, shards: ShardRouter, personaje_id: int) -> List[MisionPersonaje]:
         """Obtiene todas las misiones asignadas a un personaje"""
-        return self.db.query(MisionPersonaje).filter(
+        query = shards.session_for(personaje_id).query(MisionPersonaje).filter(
             MisionPersonaje.personaje_id == personaje_id
-        ).options(joinedload(MisionPersonaje.mision)).all()
+        )
+        if not shards.sharded:
+            return query.options(joinedload(MisionPersonaje.mision)).all()
+        
+        # Con sharding las misiones están en el catálogo: no se puede hacer JOIN
+        asignaciones = query.all()
+        mision_ids = {asignacion.mision_id for asignacion in asignaciones}
+        misiones = {
+            mision.id: mision
+            for mision in shards.catalog.query(Mision).filter(Mision.id.in_(mision_ids))
+        }
+        for asignacion in asignaciones:
+            set_committed_value(asignacion, "mision", misiones.get(asignacion.mision_id))
+        return asignaciones
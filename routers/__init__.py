@@ -1,3 +1 @@
 # Paquete de routers
-from . import personaje_router
-from . import mision_router
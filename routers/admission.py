@@ -0,0 +1,127 @@
+import asyncio
+import os
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional
+
+from fastapi import HTTPException, Request, status
+
+class AdmissionController:
+    """
+    Control de admisión para las rutas que escriben en la base de datos.
+
+    - Como máximo `max_concurrent` peticiones ejecutándose a la vez.
+    - Como máximo `max_waiting` peticiones esperando turno, cada una durante
+      `max_wait` segundos; si no hay hueco se responde 503 al momento.
+    - Como máximo `max_per_key` peticiones (ejecutándose o esperando) por
+      personaje; el exceso recibe 429. Los turnos libres se reparten en
+      round-robin entre personajes para que uno muy activo no acapare la cola.
+      Las rutas sin personaje comparten la clave None, sin límite propio.
+    """
+    def __init__(self, max_concurrent: int, max_waiting: int, max_wait: float,
+                 max_per_key: int, retry_after: int = 1):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.max_per_key = max_per_key
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self._per_key: Dict[Optional[str], int] = {}
+        # Cola de espera de cada personaje, en orden de llegada del personaje
+        self._queues: "OrderedDict[Optional[str], Deque[asyncio.Future]]" = OrderedDict()
+
+    def _reject(self, status_code: int, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after)}
+        )
+
+    async def acquire(self, key: Optional[str] = None) -> None:
+        """Espera un turno de ejecución o lanza HTTPException (429/503) si no es posible"""
+        if key is not None and self._per_key.get(key, 0) >= self.max_per_key:
+            raise self._reject(
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                "Demasiadas operaciones simultáneas para este personaje"
+            )
+
+        if self.active < self.max_concurrent and not self._queues:
+            self.active += 1
+            self._per_key[key] = self._per_key.get(key, 0) + 1
+            return
+
+        if self.waiting >= self.max_waiting:
+            raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "Servidor saturado, inténtalo más tarde")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append(future)
+        self.waiting += 1
+        self._per_key[key] = self._per_key.get(key, 0) + 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if self._abandon(key, future):
+                raise self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "Tiempo de espera agotado, inténtalo más tarde")
+            # El turno llegó justo al vencer el plazo: se aprovecha
+        except asyncio.CancelledError:
+            # El cliente se ha desconectado mientras esperaba
+            if not self._abandon(key, future):
+                self.release(key)
+            raise
+
+    def release(self, key: Optional[str] = None) -> None:
+        """Libera un turno y se lo cede al siguiente personaje en espera"""
+        self.active -= 1
+        self._release_key(key)
+        self._wake_next()
+
+    def _release_key(self, key: Optional[str]) -> None:
+        remaining = self._per_key.get(key, 0) - 1
+        if remaining > 0:
+            self._per_key[key] = remaining
+        else:
+            self._per_key.pop(key, None)
+
+    def _abandon(self, key: Optional[str], future: asyncio.Future) -> bool:
+        """Saca de la cola una petición que deja de esperar; False si ya tenía turno"""
+        if future.done():
+            return False
+        future.cancel()
+        queue = self._queues[key]
+        queue.remove(future)
+        if not queue:
+            del self._queues[key]
+        self.waiting -= 1
+        self._release_key(key)
+        return True
+
+    def _wake_next(self) -> None:
+        while self._queues and self.active < self.max_concurrent:
+            # Round-robin: se atiende al primer personaje y pasa al final si le quedan peticiones
+            key, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            self.waiting -= 1
+            if queue:
+                self._queues.move_to_end(key)
+            else:
+                del self._queues[key]
+            self.active += 1
+            future.set_result(None)
+
+# Instancia compartida por todas las rutas de escritura (configurable por entorno)
+write_admission = AdmissionController(
+    max_concurrent=int(os.getenv("RPG_WRITE_CONCURRENCY", "4")),
+    max_waiting=int(os.getenv("RPG_WRITE_QUEUE", "64")),
+    max_wait=float(os.getenv("RPG_WRITE_MAX_WAIT", "2.0")),
+    max_per_key=int(os.getenv("RPG_WRITE_PER_PERSONAJE", "4")),
+    retry_after=int(os.getenv("RPG_WRITE_RETRY_AFTER", "1")),
+)
+
+async def admit_write(request: Request):
+    """Dependencia que reserva un turno de escritura durante la petición"""
+    key = request.path_params.get("personaje_id")
+    await write_admission.acquire(key)
+    try:
+        yield
+    finally:
+        write_admission.release(key)
@@ -0,0 +1,14 @@
+from typing import Optional
+
+def make_etag(*parts) -> str:
+    """Construye un ETag fuerte a partir de sus componentes (tipo, id, versión...)"""
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comprueba si la cabecera If-None-Match contiene el ETag (comparación débil, RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
@@ -0,0 +1,220 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, NamedTuple, Optional, Set, Tuple
+
+from fastapi import Header, HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import Column, Float, Integer, MetaData, String, Table, Text, create_engine, delete, select
+
+from routers.admission import write_admission
+
+class StoredResponse(NamedTuple):
+    status_code: int
+    body: Any
+
+class IdempotencyInFlight(Exception):
+    """La misma clave se está procesando en otra petición"""
+
+# Tabla propia, fuera de Base: vive en su propio fichero para no competir con RPG.db
+_metadata = MetaData()
+_responses = Table(
+    "idempotency_responses", _metadata,
+    Column("id", String(300), primary_key=True),
+    Column("status_code", Integer, nullable=False),
+    Column("body", Text, nullable=False),
+    Column("expires_at", Float, nullable=False, index=True),
+)
+
+class IdempotencyStore:
+    """
+    Almacén acotado de respuestas por Idempotency-Key.
+
+    Las entradas caducan a los `ttl` segundos y, si hay más de `max_entries`,
+    se descartan las más antiguas. Con `url` las respuestas se guardan también
+    en SQLite, de modo que sobreviven a reinicios y se comparten entre procesos.
+    """
+    def __init__(self, max_entries: int = 10000, ttl: float = 86400, url: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, StoredResponse]]" = OrderedDict()
+        self._in_flight: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        self._url = url
+        self._engine = None
+
+    @property
+    def persistent(self) -> bool:
+        """Indica si las respuestas se guardan también en SQLite"""
+        return bool(self._url)
+
+    def _db(self):
+        if self._engine is None and self._url:
+            self._engine = create_engine(self._url)
+            _metadata.create_all(bind=self._engine)
+        return self._engine
+
+    def begin(self, scope: str, key: str) -> Optional[StoredResponse]:
+        """
+        Devuelve la respuesta guardada para la clave o, si no existe, la marca
+        como en curso y devuelve None. Lanza IdempotencyInFlight si ya está en curso.
+        """
+        entry_id = (scope, key)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is not None:
+                if entry[0] > now:
+                    return entry[1]
+                del self._entries[entry_id]
+            if entry_id in self._in_flight:
+                raise IdempotencyInFlight(key)
+            self._in_flight.add(entry_id)
+
+        try:
+            stored = self._load(entry_id, now)
+        except BaseException:
+            # Si la clave quedara marcada, todos los reintentos recibirían 409
+            self.abort(scope, key)
+            raise
+        if stored is not None:
+            with self._lock:
+                self._in_flight.discard(entry_id)
+                self._remember(entry_id, now + self.ttl, stored)
+        return stored
+
+    def finish(self, scope: str, key: str, status_code: int, body: Any) -> None:
+        """Guarda la respuesta de una clave en curso"""
+        entry_id = (scope, key)
+        stored = StoredResponse(status_code, body)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._in_flight.discard(entry_id)
+            self._remember(entry_id, expires_at, stored)
+        self._save(entry_id, expires_at, stored)
+
+    def abort(self, scope: str, key: str) -> None:
+        """Libera una clave en curso sin guardar nada (la operación falló)"""
+        with self._lock:
+            self._in_flight.discard((scope, key))
+
+    def _remember(self, entry_id: Tuple[str, str], expires_at: float, stored: StoredResponse) -> None:
+        self._entries[entry_id] = (expires_at, stored)
+        self._entries.move_to_end(entry_id)
+        # El orden de inserción coincide con el de caducidad: se purga por el principio
+        now = time.time()
+        while self._entries:
+            oldest_id, (oldest_expires, _) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_entries and oldest_expires > now:
+                break
+            del self._entries[oldest_id]
+
+    def _load(self, entry_id: Tuple[str, str], now: float) -> Optional[StoredResponse]:
+        engine = self._db()
+        if engine is None:
+            return None
+        with engine.connect() as conn:
+            row = conn.execute(
+                select(_responses.c.status_code, _responses.c.body)
+                .where(_responses.c.id == "|".join(entry_id), _responses.c.expires_at > now)
+            ).first()
+        if row is None:
+            return None
+        return StoredResponse(row.status_code, json.loads(row.body))
+
+    def _save(self, entry_id: Tuple[str, str], expires_at: float, stored: StoredResponse) -> None:
+        engine = self._db()
+        if engine is None:
+            return
+        with engine.begin() as conn:
+            conn.execute(delete(_responses).where(_responses.c.expires_at <= time.time()))
+            conn.execute(_responses.insert().prefix_with("OR REPLACE").values(
+                id="|".join(entry_id),
+                status_code=stored.status_code,
+                body=json.dumps(stored.body),
+                expires_at=expires_at,
+            ))
+
+idempotency_store = IdempotencyStore(
+    max_entries=int(os.getenv("RPG_IDEMPOTENCY_MAX", "10000")),
+    ttl=float(os.getenv("RPG_IDEMPOTENCY_TTL", "86400")),
+    url=os.getenv("RPG_IDEMPOTENCY_URL"),
+)
+
+class IdempotentCall:
+    """Escritura de una petición con (o sin) Idempotency-Key, preparada por idempotent_write"""
+    def __init__(self, scope: str, key: Optional[str], stored: Optional[StoredResponse] = None):
+        self.scope = scope
+        self.key = key
+        self.stored = stored
+    
+    def run(self, operation: Callable[[], Any], status_code: int = status.HTTP_200_OK):
+        """
+        Ejecuta `operation` una sola vez por Idempotency-Key dentro de `scope`.
+        
+        Los reintentos con la misma clave reciben la respuesta guardada sin volver
+        a ejecutar la operación. Si la operación falla no se guarda nada.
+        """
+        if self.stored is not None:
+            return ORJSONResponse(self.stored.body, status_code=self.stored.status_code,
+                                  headers={"Idempotent-Replayed": "true"})
+        if not self.key:
+            return operation()
+        
+        try:
+            result = operation()
+        except BaseException:
+            self.abort()
+            raise
+        idempotency_store.finish(self.scope, self.key, status_code, jsonable_encoder(result))
+        self.key = None
+        return result
+    
+    def abort(self) -> None:
+        """Libera la clave si sigue en curso (sin efecto si ya se guardó la respuesta)"""
+        if self.key and self.stored is None:
+            idempotency_store.abort(self.scope, self.key)
+            self.key = None
+
+def idempotent_write(scope: str):
+    """
+    Dependencia para rutas de escritura que aceptan Idempotency-Key.
+    
+    `scope` se completa con los parámetros de la ruta, p. ej. "completar:{personaje_id}".
+    La respuesta guardada se busca antes del control de admisión: los reintentos
+    se responden sin ocupar turno de escritura ni cupo del personaje. El resto de
+    peticiones reservan turno igual que admit_write.
+    """
+    async def dependency(request: Request, idempotency_key: Optional[str] = Header(None)):
+        call = IdempotentCall(scope.format(**request.path_params), idempotency_key)
+        if idempotency_key:
+            try:
+                if idempotency_store.persistent:
+                    call.stored = await run_in_threadpool(idempotency_store.begin, call.scope, idempotency_key)
+                else:
+                    call.stored = idempotency_store.begin(call.scope, idempotency_key)
+            except IdempotencyInFlight:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Ya hay una petición en curso con esta Idempotency-Key"
+                )
+            if call.stored is not None:
+                yield call
+                return
+        
+        admission_key = request.path_params.get("personaje_id")
+        try:
+            await write_admission.acquire(admission_key)
+        except BaseException:
+            call.abort()
+            raise
+        try:
+            yield call
+        finally:
+            write_admission.release(admission_key)
+            call.abort()
+    return dependency
@@ -1,85 +1,115 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import ORJSONResponse
+from typing import List, Optional
 
-from database import get_db
+from database import get_shard_router, ShardRouter
 from repositories.mision_repository import MisionRepository
 from services.mision_service import MisionService
-from dto.mision_dto import MisionCreate, MisionUpdate, MisionResponse
+from dto.mision_dto import MisionCreate, MisionUpdate, MisionResponse, MISION_FIELDS
 from RPGqueue.misionFIFO import MisionQueue
+from routers.projection import parse_fields
+from routers.etag import make_etag, etag_matches
+from routers.admission import admit_write
 
 router = APIRouter(
     prefix="/misiones",
     tags=["Misiones"]
 )
 
+# Repositorio compartido entre peticiones: la sesión llega en cada llamada a través del ShardRouter
+mision_repository = MisionRepository()
+
 # Dependencias
-def get_mission_queue():
+async def get_mission_queue() -> MisionQueue:
     return MisionQueue()
 
-def get_mision_service(db: Session = Depends(get_db), queue: MisionQueue = Depends(get_mission_queue)):
-    repository = MisionRepository(db)
-    return MisionService(repository, queue)
+async def get_mision_service(queue: MisionQueue = Depends(get_mission_queue)) -> MisionService:
+    # El servicio se crea en cada petición porque contiene su propia cola
+    return MisionService(mision_repository, queue)
 
-@router.get("/", response_model=List[MisionResponse])
+@router.get("/", response_model=List[MisionResponse],
+            response_description="Lista de misiones. Con `fields` cada elemento solo incluye los campos pedidos")
 def get_all_misiones(
     skip: int = 0, 
     limit: int = 100, 
+    fields: Optional[str] = Query(None, description="Campos a devolver, separados por comas"),
+    shards: ShardRouter = Depends(get_shard_router),
     service: MisionService = Depends(get_mision_service)
 ):
     """Obtener todas las misiones"""
-    return service.get_all_misiones(skip, limit)
+    columns = parse_fields(fields, MISION_FIELDS)
+    # Las filas salen ya con el formato de MisionResponse: se serializan directamente
+    return ORJSONResponse(service.get_all_misiones_projected(shards, skip, limit, columns))
 
 @router.get("/{mision_id}", response_model=MisionResponse)
 def get_mision(
     mision_id: int, 
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    shards: ShardRouter = Depends(get_shard_router),
     service: MisionService = Depends(get_mision_service)
 ):
-    """Obtener una misión por su ID"""
-    mision = service.get_mision_by_id(mision_id)
+    """Obtener una misión por su ID (admite If-None-Match)"""
+    revision = service.get_mision_revision(shards, mision_id)
+    if revision is None:
+        raise HTTPException(status_code=404, detail="Misión no encontrada")
+    
+    # Si el cliente ya tiene esta versión no hace falta cargar ni serializar la misión
+    etag = make_etag("mision", mision_id, *revision)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    mision = service.get_mision_by_id(shards, mision_id)
     if mision is None:
         raise HTTPException(status_code=404, detail="Misión no encontrada")
+    response.headers["ETag"] = etag
     return mision
 
-@router.post("/", response_model=MisionResponse, status_code=status.HTTP_201_CREATED)
+@router.post("/", response_model=MisionResponse, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(admit_write)])
 def create_mision(
     mision: MisionCreate, 
+    shards: ShardRouter = Depends(get_shard_router),
     service: MisionService = Depends(get_mision_service)
 ):
     """Crear una nueva misión"""
-    return service.create_mision(mision)
+    return service.create_mision(shards, mision)
 
-@router.put("/{mision_id}", response_model=MisionResponse)
+@router.put("/{mision_id}", response_model=MisionResponse, dependencies=[Depends(admit_write)])
 def update_mision(
     mision_id: int, 
     mision: MisionUpdate, 
+    shards: ShardRouter = Depends(get_shard_router),
     service: MisionService = Depends(get_mision_service)
 ):
     """Actualizar una misión existente"""
-    updated_mision = service.update_mision(mision_id, mision)
+    updated_mision = service.update_mision(shards, mision_id, mision)
     if updated_mision is None:
         raise HTTPException(status_code=404, detail="Misión no encontrada")
     return updated_mision
 
-@router.delete("/{mision_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{mision_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(admit_write)])
 def delete_mision(
     mision_id: int, 
+    shards: ShardRouter = Depends(get_shard_router),
     service: MisionService = Depends(get_mision_service)
 ):
     """Eliminar una misión"""
-    success = service.delete_mision(mision_id)
+    success = service.delete_mision(shards, mision_id)
     if not success:
         raise HTTPException(status_code=404, detail="Misión no encontrada")
     return None
 
-@router.post("/{mision_id}/asignar/{personaje_id}", status_code=status.HTTP_200_OK)
+@router.post("/{mision_id}/asignar/{personaje_id}", status_code=status.HTTP_200_OK,
+             dependencies=[Depends(admit_write)])
 def asignar_personaje(
     mision_id: int, 
     personaje_id: int, 
+    shards: ShardRouter = Depends(get_shard_router),
     service: MisionService = Depends(get_mision_service)
 ):
     """Asignar un personaje a una misión"""
-    success = service.assign_personaje_to_mision(mision_id, personaje_id)
+    success = service.assign_personaje_to_mision(shards, mision_id, personaje_id)
     if not success:
         raise HTTPException(status_code=404, detail="No se pudo realizar la asignación")
     return {"message": "Personaje asignado correctamente a la misión"}
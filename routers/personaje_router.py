@@ -1,50 +1,74 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import ORJSONResponse
+from typing import List, Optional
 
-from database import get_db
+from database import get_shard_router, ShardRouter
 from repositories.personaje_repository import PersonajeRepository
 from repositories.mision_repository import MisionRepository
 from services.personaje_service import PersonajeService
-from dto.personaje_dto import PersonajeCreate, PersonajeUpdate, PersonajeResponse
-from dto.mision_dto import MisionResponse
+from dto.personaje_dto import PersonajeCreate, PersonajeUpdate, PersonajeResponse, PERSONAJE_FIELDS
+from dto.mision_dto import MisionResponse, MISION_FIELDS
 from RPGqueue.personaje_mision_queue import PersonajeMisionQueue
+from routers.projection import parse_fields
+from routers.etag import make_etag, etag_matches
+from routers.admission import admit_write
+from routers.idempotency import IdempotentCall, idempotent_write
 
 router = APIRouter(
     prefix="/personajes",
     tags=["Personajes"]
 )
 
+# Servicio compartido entre peticiones: la sesión llega en cada llamada a través del ShardRouter
+personaje_service = PersonajeService(PersonajeRepository(), MisionRepository(), PersonajeMisionQueue())
+
 # Dependencias
-def get_personaje_service(db: Session = Depends(get_db)):
-    personaje_repo = PersonajeRepository(db)
-    mision_repo = MisionRepository(db)
-    queue = PersonajeMisionQueue()
-    return PersonajeService(personaje_repo, mision_repo, queue)
+async def get_personaje_service() -> PersonajeService:
+    return personaje_service
 
-@router.get("/", response_model=List[PersonajeResponse])
+@router.get("/", response_model=List[PersonajeResponse],
+            response_description="Lista de personajes. Con `fields` cada elemento solo incluye los campos pedidos")
 def get_all_personajes(
     skip: int = 0, 
     limit: int = 100, 
+    fields: Optional[str] = Query(None, description="Campos a devolver, separados por comas"),
+    shards: ShardRouter = Depends(get_shard_router),
     service: PersonajeService = Depends(get_personaje_service)
 ):
     """Obtener todos los personajes"""
-    return service.get_all_personajes(skip, limit)
+    columns = parse_fields(fields, PERSONAJE_FIELDS)
+    # Las filas salen ya con el formato de PersonajeResponse: se serializan directamente
+    return ORJSONResponse(service.get_all_personajes_projected(shards, skip, limit, columns))
 
 @router.get("/{personaje_id}", response_model=PersonajeResponse)
 def get_personaje(
     personaje_id: int, 
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    shards: ShardRouter = Depends(get_shard_router),
     service: PersonajeService = Depends(get_personaje_service)
 ):
-    """Obtener un personaje por su ID"""
-    personaje = service.get_personaje_by_id(personaje_id)
+    """Obtener un personaje por su ID (admite If-None-Match)"""
+    revision = service.get_personaje_revision(shards, personaje_id)
+    if revision is None:
+        raise HTTPException(status_code=404, detail="Personaje no encontrado")
+    
+    # Si el cliente ya tiene esta versión no hace falta cargar ni serializar el personaje
+    etag = make_etag("personaje", personaje_id, *revision)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    personaje = service.get_personaje_by_id(shards, personaje_id)
     if personaje is None:
         raise HTTPException(status_code=404, detail="Personaje no encontrado")
+    response.headers["ETag"] = etag
     return personaje
 
-@router.post("/", response_model=PersonajeResponse, status_code=status.HTTP_201_CREATED)
-async def create_personaje(
+@router.post("/", response_model=PersonajeResponse, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(admit_write)])
+def create_personaje(
     personaje: PersonajeCreate,
+    shards: ShardRouter = Depends(get_shard_router),
     service: PersonajeService = Depends(get_personaje_service)
 ):
     """
@@ -53,80 +77,107 @@ async def create_personaje(
     - **nombre**: Nombre del personaje (obligatorio)
     - **clase**: Clase del personaje (guerrero, mago, arquero, etc.) (obligatorio)
     """
-    return service.create_personaje(personaje)
+    return service.create_personaje(shards, personaje)
 
-@router.put("/{personaje_id}", response_model=PersonajeResponse)
+@router.put("/{personaje_id}", response_model=PersonajeResponse, dependencies=[Depends(admit_write)])
 def update_personaje(
     personaje_id: int, 
     personaje: PersonajeUpdate, 
+    shards: ShardRouter = Depends(get_shard_router),
     service: PersonajeService = Depends(get_personaje_service)
 ):
     """Actualizar un personaje existente"""
-    updated_personaje = service.update_personaje(personaje_id, personaje)
+    updated_personaje = service.update_personaje(shards, personaje_id, personaje)
     if updated_personaje is None:
         raise HTTPException(status_code=404, detail="Personaje no encontrado")
     return updated_personaje
 
-@router.delete("/{personaje_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{personaje_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(admit_write)])
 def delete_personaje(
     personaje_id: int, 
+    shards: ShardRouter = Depends(get_shard_router),
     service: PersonajeService = Depends(get_personaje_service)
 ):
     """Eliminar un personaje"""
-    success = service.delete_personaje(personaje_id)
+    success = service.delete_personaje(shards, personaje_id)
     if not success:
         raise HTTPException(status_code=404, detail="Personaje no encontrado")
     return None
 
 @router.post("/{personaje_id}/misiones/{mision_id}", status_code=status.HTTP_200_OK)
-async def accept_mission(
+def accept_mission(
     personaje_id: int,
     mision_id: int,
+    idempotent: IdempotentCall = Depends(idempotent_write("aceptar:{personaje_id}:{mision_id}")),
+    shards: ShardRouter = Depends(get_shard_router),
     service: PersonajeService = Depends(get_personaje_service)
 ):
     """
     Aceptar misión (encolar)
     
-    Asigna una misión a un personaje y la añade a su cola FIFO
+    Asigna una misión a un personaje y la añade a su cola FIFO.
+    Con la cabecera Idempotency-Key, los reintentos devuelven la respuesta original.
     """
-    success = service.accept_mission(personaje_id, mision_id)
-    if not success:
-        raise HTTPException(
-            status_code=404, 
-            detail="No se pudo aceptar la misión. Verifica que el personaje y la misión existan y que la misión esté pendiente."
-        )
-    return {"message": "Misión aceptada exitosamente", "personaje_id": personaje_id, "mision_id": mision_id}
+    def accept():
+        success = service.accept_mission(shards, personaje_id, mision_id)
+        if not success:
+            raise HTTPException(
+                status_code=404, 
+                detail="No se pudo aceptar la misión. Verifica que el personaje y la misión existan y que la misión esté pendiente."
+            )
+        return {"message": "Misión aceptada exitosamente", "personaje_id": personaje_id, "mision_id": mision_id}
+    
+    return idempotent.run(accept)
 
 @router.post("/{personaje_id}/completar", response_model=MisionResponse)
-async def complete_mission(
+def complete_mission(
     personaje_id: int,
+    idempotent: IdempotentCall = Depends(idempotent_write("completar:{personaje_id}")),
+    shards: ShardRouter = Depends(get_shard_router),
     service: PersonajeService = Depends(get_personaje_service)
 ):
     """
     Completar misión (desencolar + sumar XP)
     
-    Completa la primera misión en la cola FIFO del personaje y le otorga experiencia
+    Completa la primera misión en la cola FIFO del personaje y le otorga experiencia.
+    Con la cabecera Idempotency-Key, los reintentos devuelven la misión ya completada
+    sin volver a otorgar experiencia.
     """
-    mission = service.complete_mission(personaje_id)
-    if not mission:
-        raise HTTPException(
-            status_code=404, 
-            detail="No hay misiones pendientes para completar o el personaje no existe."
-        )
-    return mission
+    def complete():
+        mission = service.complete_mission(shards, personaje_id)
+        if not mission:
+            raise HTTPException(
+                status_code=404, 
+                detail="No hay misiones pendientes para completar o el personaje no existe."
+            )
+        return mission
+    
+    return idempotent.run(complete)
 
-@router.get("/{personaje_id}/misiones", response_model=List[MisionResponse])
-async def get_personaje_missions(
+@router.get("/{personaje_id}/misiones", response_model=List[MisionResponse],
+            response_description="Misiones en cola. Con `fields` cada elemento solo incluye los campos pedidos")
+def get_personaje_missions(
     personaje_id: int,
+    fields: Optional[str] = Query(None, description="Campos a devolver, separados por comas"),
+    if_none_match: Optional[str] = Header(None),
+    shards: ShardRouter = Depends(get_shard_router),
     service: PersonajeService = Depends(get_personaje_service)
 ):
     """
     Listar misiones en orden FIFO
     
-    Muestra todas las misiones asignadas al personaje en orden FIFO
+    Muestra todas las misiones asignadas al personaje en orden FIFO (admite If-None-Match)
     """
-    personaje = service.get_personaje_by_id(personaje_id)
-    if not personaje:
+    columns = parse_fields(fields, MISION_FIELDS)
+    revision = service.get_personaje_revision(shards, personaje_id)
+    if revision is None:
         raise HTTPException(status_code=404, detail="Personaje no encontrado")
-        
-    return service.get_personaje_misiones(personaje_id)
+    
+    # La versión del personaje cambia con cada cambio de su cola; la proyección
+    # forma parte de la representación, así que también entra en el ETag
+    etag = make_etag("cola", personaje_id, *revision, service.mision_queue.epoch, *(columns if fields else ()))
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    misiones = service.get_personaje_misiones_projected(personaje_id, columns)
+    return ORJSONResponse(misiones, headers={"ETag": etag})
@@ -0,0 +1,21 @@
+from fastapi import HTTPException, status
+from typing import List, Optional, Sequence
+
+def parse_fields(fields: Optional[str], allowed: Sequence[str]) -> List[str]:
+    """
+    Convierte el parámetro ?fields= (separado por comas) en la lista de campos a seleccionar.
+
+    Sin el parámetro se devuelven todos los campos permitidos.
+    """
+    requested = [field.strip() for field in (fields or "").split(",") if field.strip()]
+    if not requested:
+        return list(allowed)
+    
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Campos no válidos: {', '.join(unknown)}. Permitidos: {', '.join(allowed)}"
+        )
+    # Eliminar duplicados conservando el orden pedido
+    return list(dict.fromkeys(requested))
@@ -1,35 +1,43 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from database import ShardRouter
 from repositories.mision_repository import MisionRepository
 from dto.mision_dto import MisionCreate, MisionUpdate, MisionResponse, EstadoMision
 from models.Mision import Mision
 from RPGqueue.misionFIFO import MisionQueue
 
 class MisionService:
+    """Servicio de misiones: cada método recibe el ShardRouter de la petición"""
+    
     def __init__(self, repository: MisionRepository, queue: MisionQueue):
         self.repository = repository
         self.queue = queue
     
-    def get_all_misiones(self, skip: int = 0, limit: int = 100) -> List[MisionResponse]:
-        misiones = self.repository.get_all(skip, limit)
-        return [MisionResponse.model_validate(mision) for mision in misiones]
+    def get_all_misiones_projected(self, shards: ShardRouter, skip: int = 0, limit: int = 100,
+                                   fields: Sequence[str] = ()) -> List[Dict[str, Any]]:
+        """Obtiene las misiones como diccionarios con solo los campos pedidos, sin pasar por Pydantic"""
+        rows = self.repository.get_all_rows(shards, skip, limit, fields)
+        return [dict(zip(fields, row)) for row in rows]
     
-    def get_mision_by_id(self, mision_id: int) -> Optional[MisionResponse]:
-        mision = self.repository.get_by_id(mision_id)
+    def get_mision_by_id(self, shards: ShardRouter, mision_id: int) -> Optional[MisionResponse]:
+        mision = self.repository.get_by_id(shards, mision_id)
         if mision:
             return MisionResponse.model_validate(mision)
         return None
     
-    def create_mision(self, mision: MisionCreate) -> MisionResponse:
-        db_mision = self.repository.create(mision)
+    def get_mision_revision(self, shards: ShardRouter, mision_id: int) -> Optional[Tuple[str, int]]:
+        return self.repository.get_revision(shards, mision_id)
+    
+    def create_mision(self, shards: ShardRouter, mision: MisionCreate) -> MisionResponse:
+        db_mision = self.repository.create(shards, mision)
         # Al crear una misión, la añadimos a la cola de misiones pendientes
         self.queue.enqueue(db_mision)
         return MisionResponse.model_validate(db_mision)
     
-    def update_mision(self, mision_id: int, mision_update: MisionUpdate) -> Optional[MisionResponse]:
+    def update_mision(self, shards: ShardRouter, mision_id: int, mision_update: MisionUpdate) -> Optional[MisionResponse]:
         # Convertimos el modelo Pydantic a diccionario
         update_data = mision_update.model_dump(exclude_unset=True)
         
-        updated_mision = self.repository.update(mision_id, update_data)
+        updated_mision = self.repository.update(shards, mision_id, update_data)
         if updated_mision:
             # Si el estado cambia a completado, manejamos la experiencia
             if update_data.get('estado') == EstadoMision.COMPLETADA:
@@ -37,11 +45,11 @@ class MisionService:
             return MisionResponse.model_validate(updated_mision)
         return None
     
-    def delete_mision(self, mision_id: int) -> bool:
-        return self.repository.delete(mision_id)
+    def delete_mision(self, shards: ShardRouter, mision_id: int) -> bool:
+        return self.repository.delete(shards, mision_id)
     
-    def assign_personaje_to_mision(self, mision_id: int, personaje_id: int) -> bool:
-        result = self.repository.asignar_personaje(mision_id, personaje_id)
+    def assign_personaje_to_mision(self, shards: ShardRouter, mision_id: int, personaje_id: int) -> bool:
+        result = self.repository.asignar_personaje(shards, mision_id, personaje_id)
         return result is not None
     
     def get_next_pending_mission(self) -> Optional[MisionResponse]:
@@ -1,4 +1,5 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from database import ShardRouter
 from repositories.personaje_repository import PersonajeRepository
 from repositories.mision_repository import MisionRepository
 from dto.personaje_dto import PersonajeCreate, PersonajeUpdate, PersonajeResponse
@@ -6,6 +7,8 @@ from dto.mision_dto import MisionResponse, EstadoMision
 from RPGqueue.personaje_mision_queue import PersonajeMisionQueue
 
 class PersonajeService:
+    """Servicio compartido entre peticiones: cada método recibe el ShardRouter de la petición"""
+    
     def __init__(self, 
                 personaje_repository: PersonajeRepository, 
                 mision_repository: MisionRepository,
@@ -14,60 +17,65 @@ class PersonajeService:
         self.mision_repository = mision_repository
         self.mision_queue = mision_queue
     
-    def get_all_personajes(self, skip: int = 0, limit: int = 100) -> List[PersonajeResponse]:
-        personajes = self.personaje_repository.get_all(skip, limit)
-        return [PersonajeResponse.model_validate(personaje) for personaje in personajes]
+    def get_all_personajes_projected(self, shards: ShardRouter, skip: int = 0, limit: int = 100,
+                                     fields: Sequence[str] = ()) -> List[Dict[str, Any]]:
+        """Obtiene los personajes como diccionarios con solo los campos pedidos, sin pasar por Pydantic"""
+        rows = self.personaje_repository.get_all_rows(shards, skip, limit, fields)
+        return [dict(zip(fields, row)) for row in rows]
     
-    def get_personaje_by_id(self, personaje_id: int) -> Optional[PersonajeResponse]:
-        personaje = self.personaje_repository.get_by_id(personaje_id)
+    def get_personaje_by_id(self, shards: ShardRouter, personaje_id: int) -> Optional[PersonajeResponse]:
+        personaje = self.personaje_repository.get_by_id(shards, personaje_id)
         if personaje:
             return PersonajeResponse.model_validate(personaje)
         return None
     
-    def create_personaje(self, personaje: PersonajeCreate) -> PersonajeResponse:
-        db_personaje = self.personaje_repository.create(personaje)
+    def get_personaje_revision(self, shards: ShardRouter, personaje_id: int) -> Optional[Tuple[str, int]]:
+        return self.personaje_repository.get_revision(shards, personaje_id)
+    
+    def create_personaje(self, shards: ShardRouter, personaje: PersonajeCreate) -> PersonajeResponse:
+        db_personaje = self.personaje_repository.create(shards, personaje)
         return PersonajeResponse.model_validate(db_personaje)
     
-    def update_personaje(self, personaje_id: int, personaje: PersonajeUpdate) -> Optional[PersonajeResponse]:
-        updated_personaje = self.personaje_repository.update(personaje_id, personaje)
+    def update_personaje(self, shards: ShardRouter, personaje_id: int, personaje: PersonajeUpdate) -> Optional[PersonajeResponse]:
+        updated_personaje = self.personaje_repository.update(shards, personaje_id, personaje)
         if updated_personaje:
             return PersonajeResponse.model_validate(updated_personaje)
         return None
     
-    def delete_personaje(self, personaje_id: int) -> bool:
-        return self.personaje_repository.delete(personaje_id)
+    def delete_personaje(self, shards: ShardRouter, personaje_id: int) -> bool:
+        return self.personaje_repository.delete(shards, personaje_id)
     
-    def accept_mission(self, personaje_id: int, mision_id: int) -> bool:
+    def accept_mission(self, shards: ShardRouter, personaje_id: int, mision_id: int) -> bool:
         """Acepta una misión y la agrega a la cola FIFO del personaje"""
-        # Verificar que el personaje y la misión existen
-        personaje = self.personaje_repository.get_by_id(personaje_id)
-        mision = self.mision_repository.get_by_id(mision_id)
-        
-        if not personaje or not mision:
+        # Verificar que el personaje existe
+        personaje = self.personaje_repository.get_by_id(shards, personaje_id)
+        if not personaje:
             return False
         
-        # Verificar que la misión está pendiente
-        if mision.estado != "pendiente":
+        # Pasar la misión a en progreso solo si sigue pendiente: si dos personajes
+        # la aceptan a la vez, únicamente uno de ellos la obtiene
+        mision = self.mision_repository.start_if_pending(shards, mision_id)
+        if not mision:
             return False
         
-        # Asignar la misión al personaje
-        asignacion = self.mision_repository.asignar_personaje(mision_id, personaje_id)
+        # Agregar a la cola del personaje
+        self.mision_queue.enqueue(personaje_id, mision)
+        
+        # La versión (y con ella el ETag de la cola) cambia después de la cola, nunca
+        # antes: así ninguna lectura asocia la versión nueva a la cola anterior.
+        # Se confirma en la misma transacción del shard que la asignación.
+        self.personaje_repository.touch(shards, personaje_id, commit=False)
+        asignacion = self.mision_repository.asignar_personaje(shards, mision_id, personaje_id)
         
         if not asignacion:
             return False
         
-        # Cambiar estado de la misión
-        self.mision_repository.update(mision_id, {"estado": EstadoMision.EN_PROGRESO})
-        
-        # Agregar a la cola del personaje
-        self.mision_queue.enqueue(personaje_id, mision)
-        
         return True
     
-    def complete_mission(self, personaje_id: int) -> Optional[MisionResponse]:
+    def complete_mission(self, shards: ShardRouter, personaje_id: int) -> Optional[MisionResponse]:
         """Completa la siguiente misión en la cola FIFO del personaje"""
         # Verificar que el personaje existe
-        personaje = self.personaje_repository.get_by_id(personaje_id)
+        personaje = self.personaje_repository.get_by_id(shards, personaje_id)
         if not personaje:
             return None
         
@@ -77,22 +85,18 @@ class PersonajeService:
             return None
         
         # Actualizar estado de la misión
-        self.mision_repository.update(mision.id, {"estado": EstadoMision.COMPLETADA})
+        self.mision_repository.update(shards, mision.id, {"estado": EstadoMision.COMPLETADA})
         
         # Añadir experiencia al personaje
-        self.personaje_repository.add_experience(personaje_id, mision.experiencia)
+        self.personaje_repository.add_experience(shards, personaje_id, mision.experiencia)
         
         # Devolver la misión completada
         return MisionResponse.from_orm(mision)
     
-    def get_personaje_misiones(self, personaje_id: int) -> List[MisionResponse]:
-        """Obtiene todas las misiones en la cola FIFO del personaje"""
-        # Verificar que el personaje existe
-        personaje = self.personaje_repository.get_by_id(personaje_id)
-        if not personaje:
-            return []
-        
-        # Obtener todas las misiones en la cola
+    def get_personaje_misiones_projected(self, personaje_id: int, fields: Sequence[str] = ()) -> List[Dict[str, Any]]:
+        """
+        Obtiene las misiones de la cola FIFO con solo los campos pedidos.
+        No comprueba que el personaje exista: lo hace el router al consultar su versión.
+        """
         misiones = self.mision_queue.get_all(personaje_id)
-        
-        return [MisionResponse.from_orm(mision) for mision in misiones]
+        return [{field: getattr(mision, field) for field in fields} for mision in misiones]
@@ -0,0 +1,39 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import database
+import routers.idempotency as idempotency
+from RPGqueue.personaje_mision_queue import PersonajeMisionQueue
+from routers.idempotency import IdempotencyStore
+
+@pytest.fixture
+def shard_count() -> int:
+    """Número de shards de la base de pruebas (se sobrescribe con parametrize)"""
+    return 1
+
+@pytest.fixture
+def database_dir(tmp_path, monkeypatch, shard_count):
+    """Bases de datos nuevas en un directorio temporal: RPG.db y, con sharding, un fichero por shard"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'RPG.db'}")
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    monkeypatch.setattr(database, "SHARD_COUNT", shard_count)
+    monkeypatch.setattr(database, "SHARD_URL_TEMPLATE", f"sqlite:///{tmp_path / 'RPG_shard{}.db'}")
+    monkeypatch.setattr(database, "_shard_engines", {} if shard_count > 1 else {0: engine})
+    monkeypatch.setattr(database, "_shard_sessions", {} if shard_count > 1 else {0: database.SessionLocal})
+    database.init_db()
+    # Las colas de personaje viven en un singleton compartido por todo el proceso
+    PersonajeMisionQueue().queues.clear()
+    yield tmp_path
+    for shard_engine in database._shard_engines.values():
+        shard_engine.dispose()
+
+@pytest.fixture
+def api(database_dir, monkeypatch) -> TestClient:
+    """Cliente de la aplicación completa sobre las bases temporales"""
+    import main
+    monkeypatch.setattr(idempotency, "idempotency_store", IdempotencyStore())
+    with TestClient(main.app) as client:
+        yield client
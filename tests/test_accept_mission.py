@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from database import ShardRouter
+from dto.mision_dto import MisionCreate
+from dto.personaje_dto import PersonajeCreate
+from models.MisionPersonaje import MisionPersonaje
+from routers.mision_router import mision_repository
+from routers.personaje_router import personaje_service
+
+PERSONAJES = 8
+MISIONES = 20
+
+@pytest.mark.parametrize("shard_count", [1, 2])
+def test_cada_mision_la_acepta_un_solo_personaje(database_dir):
+    shards = ShardRouter()
+    for i in range(PERSONAJES):
+        personaje_service.create_personaje(shards, PersonajeCreate(nombre=f"P{i}", clase="mago"))
+    for i in range(MISIONES):
+        mision_repository.create(shards, MisionCreate(nombre=f"Mision {i}", descripcion="Mision de prueba", experiencia=10))
+    shards.close()
+    
+    barrier = threading.Barrier(PERSONAJES)
+    accepted = []
+    errors = []
+    
+    def accept_all(personaje_id: int):
+        shards = ShardRouter()
+        try:
+            barrier.wait()
+            for mision_id in range(1, MISIONES + 1):
+                if personaje_service.accept_mission(shards, personaje_id, mision_id):
+                    accepted.append(mision_id)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            shards.close()
+    
+    threads = [threading.Thread(target=accept_all, args=(personaje_id,)) for personaje_id in range(1, PERSONAJES + 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert not errors
+    assert sorted(accepted) == list(range(1, MISIONES + 1))
+    queued = [mision.id for personaje_id in range(1, PERSONAJES + 1)
+              for mision in personaje_service.mision_queue.get_all(personaje_id)]
+    assert sorted(queued) == list(range(1, MISIONES + 1))
+    
+    shards = ShardRouter()
+    asignaciones = sum(session.query(MisionPersonaje).count() for session in shards.all_sessions())
+    shards.close()
+    assert asignaciones == MISIONES
@@ -0,0 +1,107 @@
+import pytest
+
+MISION = {"nombre": "Mision", "descripcion": "Mision de prueba", "experiencia": 150}
+
+def create_personaje(api, nombre: str = "Pe") -> int:
+    return api.post("/personajes/", json={"nombre": nombre, "clase": "mago"}).json()["id"]
+
+def create_mision(api) -> int:
+    return api.post("/misiones/", json=MISION).json()["id"]
+
+def assert_not_modified(api, path: str, etag: str, if_none_match: str = None) -> None:
+    response = api.get(path, headers={"If-None-Match": if_none_match or etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+def assert_modified(api, path: str, etag: str) -> str:
+    """Comprueba que el ETag anterior ya no vale y devuelve el nuevo"""
+    response = api.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    return response.headers["ETag"]
+
+def test_personaje_cambia_al_actualizarlo(api):
+    personaje_id = create_personaje(api)
+    path = f"/personajes/{personaje_id}"
+    etag = api.get(path).headers["ETag"]
+    assert_not_modified(api, path, etag)
+    assert_not_modified(api, path, etag, f'"otro", W/{etag}')
+    
+    api.put(path, json={"nombre": "Renombrado"})
+    etag = assert_modified(api, path, etag)
+    assert_not_modified(api, path, etag)
+
+def test_personaje_cambia_al_ganar_experiencia(api):
+    personaje_id = create_personaje(api)
+    mision_id = create_mision(api)
+    api.post(f"/personajes/{personaje_id}/misiones/{mision_id}")
+    path = f"/personajes/{personaje_id}"
+    etag = api.get(path).headers["ETag"]
+    
+    api.post(f"/personajes/{personaje_id}/completar")
+    assert_modified(api, path, etag)
+    assert api.get(path).json()["experiencia"] == MISION["experiencia"]
+
+def test_mision_cambia_al_actualizarla_y_al_aceptarla(api):
+    mision_id = create_mision(api)
+    path = f"/misiones/{mision_id}"
+    etag = api.get(path).headers["ETag"]
+    assert_not_modified(api, path, etag)
+    
+    api.put(path, json={"experiencia": 200})
+    etag = assert_modified(api, path, etag)
+    
+    personaje_id = create_personaje(api)
+    api.post(f"/personajes/{personaje_id}/misiones/{mision_id}")
+    assert_modified(api, path, etag)
+
+def test_cola_cambia_al_aceptar_y_completar(api):
+    personaje_id = create_personaje(api)
+    mision_id = create_mision(api)
+    path = f"/personajes/{personaje_id}/misiones"
+    etag = api.get(path).headers["ETag"]
+    assert_not_modified(api, path, etag)
+    
+    api.post(f"/personajes/{personaje_id}/misiones/{mision_id}")
+    etag = assert_modified(api, path, etag)
+    assert [mision["id"] for mision in api.get(path).json()] == [mision_id]
+    
+    api.post(f"/personajes/{personaje_id}/completar")
+    assert_modified(api, path, etag)
+    assert api.get(path).json() == []
+
+def test_cola_distingue_la_proyeccion(api):
+    personaje_id = create_personaje(api)
+    path = f"/personajes/{personaje_id}/misiones"
+    etag = api.get(path).headers["ETag"]
+    response = api.get(f"{path}?fields=id", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+@pytest.mark.parametrize("shard_count", [1, 2])
+def test_personaje_recreado_con_el_mismo_id_tiene_otro_etag(api):
+    ids = [create_personaje(api, f"P{i}") for i in range(3)]
+    path = f"/personajes/{ids[-1]}"
+    etag = api.get(path).headers["ETag"]
+    queue_etag = api.get(f"{path}/misiones").headers["ETag"]
+    
+    api.delete(path)
+    # Los ids no se reservan: el siguiente personaje del shard reutiliza el borrado
+    while create_personaje(api) != ids[-1]:
+        pass
+    assert_modified(api, path, etag)
+    assert_modified(api, f"{path}/misiones", queue_etag)
+
+def test_mision_recreada_con_el_mismo_id_tiene_otro_etag(api):
+    mision_id = create_mision(api)
+    path = f"/misiones/{mision_id}"
+    etag = api.get(path).headers["ETag"]
+    
+    api.delete(path)
+    assert create_mision(api) == mision_id
+    assert_modified(api, path, etag)
+
+def test_recurso_inexistente_responde_404(api):
+    assert api.get("/personajes/99", headers={"If-None-Match": "*"}).status_code == 404
+    assert api.get("/misiones/99").status_code == 404
+    assert api.get("/personajes/99/misiones").status_code == 404
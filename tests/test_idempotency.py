@@ -0,0 +1,138 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+import routers.idempotency as idempotency
+from routers.admission import AdmissionController
+from routers.idempotency import IdempotencyInFlight, IdempotencyStore, IdempotentCall, StoredResponse, idempotent_write
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+    
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(idempotency.time, "time", fake)
+    return fake
+
+def test_reintento_recibe_la_respuesta_guardada():
+    store = IdempotencyStore()
+    assert store.begin("completar:1", "k") is None
+    store.finish("completar:1", "k", 200, {"id": 1})
+    assert store.begin("completar:1", "k") == StoredResponse(200, {"id": 1})
+    # La misma clave en otro ámbito es independiente
+    assert store.begin("completar:2", "k") is None
+
+def test_clave_en_curso_lanza_conflicto():
+    store = IdempotencyStore()
+    store.begin("completar:1", "k")
+    with pytest.raises(IdempotencyInFlight):
+        store.begin("completar:1", "k")
+    
+    # Tras un fallo la clave queda libre y el reintento se ejecuta de nuevo
+    store.abort("completar:1", "k")
+    assert store.begin("completar:1", "k") is None
+
+def test_las_entradas_caducan_tras_el_ttl(clock):
+    store = IdempotencyStore(ttl=60)
+    store.begin("completar:1", "k")
+    store.finish("completar:1", "k", 200, {"id": 1})
+    
+    clock.now += 59
+    assert store.begin("completar:1", "k") is not None
+    clock.now += 2
+    assert store.begin("completar:1", "k") is None
+
+def test_se_descartan_las_entradas_mas_antiguas():
+    store = IdempotencyStore(max_entries=2)
+    for key in ("a", "b", "c"):
+        store.begin("completar:1", key)
+        store.finish("completar:1", key, 200, key)
+    
+    assert len(store._entries) == 2
+    assert store.begin("completar:1", "a") is None
+    assert store.begin("completar:1", "c") == StoredResponse(200, "c")
+
+def test_las_respuestas_persisten_entre_instancias(tmp_path):
+    url = f"sqlite:///{tmp_path / 'idempotency.db'}"
+    first = IdempotencyStore(url=url)
+    first.begin("aceptar:1:2", "k")
+    first.finish("aceptar:1:2", "k", 200, {"message": "ok", "ids": [1, 2]})
+    
+    # Otra instancia (p. ej. tras un reinicio) encuentra la respuesta en SQLite
+    second = IdempotencyStore(url=url)
+    assert second.begin("aceptar:1:2", "k") == StoredResponse(200, {"message": "ok", "ids": [1, 2]})
+    assert not second._in_flight
+
+def test_las_respuestas_persistidas_tambien_caducan(tmp_path, clock):
+    url = f"sqlite:///{tmp_path / 'idempotency.db'}"
+    first = IdempotencyStore(ttl=60, url=url)
+    first.begin("completar:1", "k")
+    first.finish("completar:1", "k", 200, {"id": 1})
+    
+    clock.now += 61
+    assert IdempotencyStore(ttl=60, url=url).begin("completar:1", "k") is None
+
+def test_un_fallo_al_consultar_libera_la_clave(monkeypatch):
+    store = IdempotencyStore()
+    
+    def broken_load(entry_id, now):
+        raise RuntimeError("SQLite no disponible")
+    
+    monkeypatch.setattr(store, "_load", broken_load)
+    with pytest.raises(RuntimeError):
+        store.begin("completar:1", "k")
+    assert not store._in_flight
+    
+    monkeypatch.undo()
+    assert store.begin("completar:1", "k") is None
+
+@pytest.fixture
+def client(monkeypatch):
+    """Aplicación mínima con una ruta idempotente, un almacén y un control de admisión propios"""
+    store = IdempotencyStore()
+    admission = AdmissionController(max_concurrent=1, max_waiting=0, max_wait=1.0, max_per_key=1)
+    monkeypatch.setattr(idempotency, "idempotency_store", store)
+    monkeypatch.setattr(idempotency, "write_admission", admission)
+    
+    app = FastAPI()
+    calls = []
+    
+    @app.post("/personajes/{personaje_id}/completar")
+    def complete(personaje_id: int, idempotent: IdempotentCall = Depends(idempotent_write("completar:{personaje_id}"))):
+        def operation():
+            calls.append(personaje_id)
+            return {"llamadas": len(calls)}
+        return idempotent.run(operation)
+    
+    test_client = TestClient(app)
+    test_client.store = store
+    test_client.admission = admission
+    return test_client
+
+def test_la_ruta_ejecuta_la_operacion_una_sola_vez(client):
+    headers = {"Idempotency-Key": "k"}
+    first = client.post("/personajes/1/completar", headers=headers)
+    replay = client.post("/personajes/1/completar", headers=headers)
+    assert first.json() == replay.json() == {"llamadas": 1}
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert client.post("/personajes/1/completar").json() == {"llamadas": 2}
+
+def test_la_ruta_responde_409_si_la_clave_esta_en_curso(client):
+    client.store.begin("completar:1", "k")
+    response = client.post("/personajes/1/completar", headers={"Idempotency-Key": "k"})
+    assert response.status_code == 409
+
+def test_los_reintentos_no_pasan_por_el_control_de_admision(client):
+    headers = {"Idempotency-Key": "k"}
+    client.post("/personajes/1/completar", headers=headers)
+    
+    # Con las escrituras saturadas, una clave nueva se rechaza pero el reintento se responde
+    client.admission.active = client.admission.max_concurrent
+    assert client.post("/personajes/1/completar", headers={"Idempotency-Key": "otra"}).status_code == 503
+    assert not client.store._in_flight
+    assert client.post("/personajes/1/completar", headers=headers).status_code == 200
@@ -0,0 +1,103 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+import database
+from database import Base, SCHEMA_VERSION, _migrate
+
+# Esquema de RPG.db antes del versionado (sin schema_version, version ni uid)
+BASELINE_SCHEMA = [
+    """CREATE TABLE personajes (
+        id INTEGER NOT NULL, nombre VARCHAR(50) NOT NULL, nivel INTEGER,
+        clase VARCHAR(50) NOT NULL, experiencia INTEGER, PRIMARY KEY (id))""",
+    """CREATE TABLE misiones (
+        id INTEGER NOT NULL, nombre VARCHAR(50) NOT NULL, descripcion VARCHAR(200) NOT NULL,
+        experiencia INTEGER NOT NULL, estado VARCHAR(11) NOT NULL, fecha_inicio DATETIME NOT NULL,
+        PRIMARY KEY (id))""",
+    """CREATE TABLE mision_personaje (
+        id INTEGER NOT NULL, mision_id INTEGER NOT NULL, personaje_id INTEGER NOT NULL, PRIMARY KEY (id),
+        FOREIGN KEY(mision_id) REFERENCES misiones (id), FOREIGN KEY(personaje_id) REFERENCES personajes (id))""",
+    "INSERT INTO personajes (id, nombre, nivel, clase, experiencia) VALUES (1, 'Antiguo', 2, 'mago', 150)",
+    """INSERT INTO misiones (id, nombre, descripcion, experiencia, estado, fecha_inicio)
+        VALUES (1, 'Antigua', 'Mision anterior', 50, 'pendiente', '2024-01-01 00:00:00')""",
+]
+
+@pytest.fixture
+def tables():
+    # Registra los modelos en Base.metadata
+    import models.Personaje, models.Mision, models.MisionPersonaje
+    return Base.metadata.sorted_tables
+
+@pytest.fixture
+def baseline_url(tmp_path) -> str:
+    url = f"sqlite:///{tmp_path / 'RPG.db'}"
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+    engine.dispose()
+    return url
+
+def schema_of(url: str):
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        version = conn.execute(text("SELECT version FROM schema_version")).scalar()
+        columns = {table: {column["name"] for column in inspect(conn).get_columns(table)}
+                   for table in ("personajes", "misiones")}
+        rows = {table: conn.execute(text(f"SELECT id, version, uid FROM {table}")).all()
+                for table in ("personajes", "misiones")}
+    engine.dispose()
+    return version, columns, rows
+
+def test_migra_una_base_anterior_al_versionado(baseline_url, tables):
+    engine = create_engine(baseline_url)
+    assert _migrate(engine, tables) == SCHEMA_VERSION
+    assert _migrate(engine, tables) == 0
+    engine.dispose()
+    
+    version, columns, rows = schema_of(baseline_url)
+    assert version == SCHEMA_VERSION
+    for table in ("personajes", "misiones"):
+        assert {"version", "uid"} <= columns[table]
+        [(row_id, row_version, uid)] = rows[table]
+        assert (row_id, row_version) == (1, 1)
+        assert len(uid) == 32
+
+def test_varios_procesos_arrancando_a_la_vez_migran_una_sola_vez(baseline_url, tables):
+    workers = 4
+    barrier = threading.Barrier(workers)
+    applied = []
+    errors = []
+    
+    def boot():
+        # Cada "proceso" tiene su propio engine y, por tanto, sus propias conexiones
+        engine = create_engine(baseline_url)
+        try:
+            barrier.wait()
+            applied.append(_migrate(engine, tables))
+        except Exception as error:
+            errors.append(error)
+        finally:
+            engine.dispose()
+    
+    threads = [threading.Thread(target=boot) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert not errors
+    assert sorted(applied) == [0] * (workers - 1) + [SCHEMA_VERSION]
+    version, columns, _ = schema_of(baseline_url)
+    assert version == SCHEMA_VERSION
+    assert {"version", "uid"} <= columns["personajes"]
+
+def test_base_nueva_se_crea_completa(tmp_path, tables):
+    url = f"sqlite:///{tmp_path / 'nueva.db'}"
+    engine = create_engine(url)
+    assert _migrate(engine, tables) == SCHEMA_VERSION
+    engine.dispose()
+    version, columns, rows = schema_of(url)
+    assert version == SCHEMA_VERSION
+    assert rows == {"personajes": [], "misiones": []}
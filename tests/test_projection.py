@@ -0,0 +1,69 @@
+import pytest
+from fastapi import HTTPException
+
+from dto.mision_dto import MISION_FIELDS, MisionResponse
+from dto.personaje_dto import PERSONAJE_FIELDS, PersonajeResponse
+from routers.projection import parse_fields
+
+MISION = {"nombre": "Mision", "descripcion": "Mision de prueba", "experiencia": 150}
+
+def test_sin_campos_devuelve_todos():
+    assert parse_fields(None, PERSONAJE_FIELDS) == list(PERSONAJE_FIELDS)
+    assert parse_fields("", PERSONAJE_FIELDS) == list(PERSONAJE_FIELDS)
+
+def test_respeta_el_orden_y_descarta_repetidos():
+    assert parse_fields(" nivel, id ,nivel,", PERSONAJE_FIELDS) == ["nivel", "id"]
+
+def test_campo_desconocido_responde_400():
+    with pytest.raises(HTTPException) as error:
+        parse_fields("id,password", PERSONAJE_FIELDS)
+    assert error.value.status_code == 400
+    assert "password" in error.value.detail
+
+@pytest.fixture
+def datos(api):
+    personaje_id = api.post("/personajes/", json={"nombre": "Pe", "clase": "mago"}).json()["id"]
+    mision_ids = [api.post("/misiones/", json=MISION).json()["id"] for _ in range(2)]
+    api.post(f"/personajes/{personaje_id}/misiones/{mision_ids[0]}")
+    return personaje_id, mision_ids
+
+@pytest.mark.parametrize("path", ["/personajes/", "/misiones/", "/personajes/{personaje_id}/misiones"])
+def test_listados_rechazan_campos_desconocidos(api, datos, path):
+    response = api.get(path.format(personaje_id=datos[0]), params={"fields": "id,desconocido"})
+    assert response.status_code == 400
+    assert "desconocido" in response.json()["detail"]
+
+@pytest.mark.parametrize("path, fields", [
+    ("/personajes/", "nivel,id"),
+    ("/misiones/", "estado,id"),
+    ("/personajes/{personaje_id}/misiones", "experiencia,nombre"),
+])
+def test_listados_proyectados_solo_tienen_los_campos_pedidos(api, datos, path, fields):
+    items = api.get(path.format(personaje_id=datos[0]), params={"fields": fields}).json()
+    assert items
+    assert all(list(item) == fields.split(",") for item in items)
+
+@pytest.mark.parametrize("shard_count", [1, 2])
+def test_listado_de_personajes_sin_campos_coincide_con_el_modelo(api, datos):
+    personaje_id, _ = datos
+    [item] = api.get("/personajes/").json()
+    assert list(item) == list(PERSONAJE_FIELDS)
+    assert PersonajeResponse.model_validate(item).model_dump(mode="json") == item
+    # Misma representación que la ruta de detalle, que sí pasa por response_model
+    assert item == api.get(f"/personajes/{personaje_id}").json()
+
+def test_listado_de_misiones_sin_campos_coincide_con_el_modelo(api, datos):
+    _, mision_ids = datos
+    items = api.get("/misiones/").json()
+    assert [item["id"] for item in items] == mision_ids
+    for item in items:
+        assert list(item) == list(MISION_FIELDS)
+        assert MisionResponse.model_validate(item).model_dump(mode="json") == item
+        assert item == api.get(f"/misiones/{item['id']}").json()
+
+def test_cola_sin_campos_coincide_con_el_modelo(api, datos):
+    personaje_id, mision_ids = datos
+    [item] = api.get(f"/personajes/{personaje_id}/misiones").json()
+    assert list(item) == list(MISION_FIELDS)
+    assert MisionResponse.model_validate(item).model_dump(mode="json") == item
+    assert item == api.get(f"/misiones/{mision_ids[0]}").json()
@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+
+import database
+from database import ShardRouter, shard_for
+from dto.mision_dto import MisionCreate
+from dto.personaje_dto import PersonajeCreate
+from models.Personaje import Personaje
+from repositories.personaje_repository import PersonajeRepository
+from routers.mision_router import mision_repository
+from routers.personaje_router import personaje_service
+
+repository = PersonajeRepository()
+
+def create(shards: ShardRouter, nombre: str = "Pe") -> int:
+    return repository.create(shards, PersonajeCreate(nombre=nombre, clase="mago")).id
+
+def ids_by_shard(shards: ShardRouter):
+    return {shard: sorted(pid for (pid,) in shards.session_for_shard(shard).query(Personaje.id))
+            for shard in range(shards.shard_count)}
+
+def assert_ids_in_expected_shard(shards: ShardRouter) -> None:
+    for shard, ids in ids_by_shard(shards).items():
+        assert all(shard_for(pid) == shard for pid in ids), (shard, ids)
+
+def test_shard_for_intercala_los_ids(monkeypatch):
+    monkeypatch.setattr(database, "SHARD_COUNT", 3)
+    assert [shard_for(pid) for pid in range(1, 8)] == [0, 1, 2, 0, 1, 2, 0]
+
+@pytest.mark.parametrize("shard_count", [2, 3])
+def test_los_ids_caen_en_el_shard_esperado(database_dir, shard_count):
+    shards = ShardRouter()
+    ids = [create(shards, f"P{i}") for i in range(10)]
+    assert len(set(ids)) == len(ids)
+    assert sorted(pid for shard_ids in ids_by_shard(shards).values() for pid in shard_ids) == sorted(ids)
+    assert_ids_in_expected_shard(shards)
+    # Cada shard tiene su propio fichero
+    assert all(len(ids) > 0 for ids in ids_by_shard(shards).values())
+    shards.close()
+
+@pytest.mark.parametrize("shard_count", [2, 3])
+def test_borrar_el_id_maximo_no_rompe_el_reparto(database_dir, shard_count):
+    shards = ShardRouter()
+    for i in range(2 * shard_count):
+        create(shards, f"P{i}")
+    max_id = 2 * shard_count
+    assert repository.delete(shards, max_id)
+    
+    new_ids = [create(shards, f"N{i}") for i in range(2 * shard_count)]
+    assert len(set(new_ids)) == len(new_ids)
+    # El id borrado se reutiliza en su propio shard
+    assert max_id in new_ids
+    assert_ids_in_expected_shard(shards)
+    shards.close()
+
+@pytest.mark.parametrize("shard_count", [2, 3])
+def test_creaciones_simultaneas_no_repiten_ids(database_dir, shard_count):
+    workers, per_worker = 8, 10
+    barrier = threading.Barrier(workers)
+    created = []
+    errors = []
+    
+    def create_many(worker: int):
+        shards = ShardRouter()
+        try:
+            barrier.wait()
+            for i in range(per_worker):
+                created.append(create(shards, f"W{worker}-{i}"))
+        except Exception as error:
+            errors.append(error)
+        finally:
+            shards.close()
+    
+    threads = [threading.Thread(target=create_many, args=(worker,)) for worker in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert not errors
+    assert len(set(created)) == workers * per_worker
+    shards = ShardRouter()
+    assert_ids_in_expected_shard(shards)
+    shards.close()
+
+@pytest.mark.parametrize("shard_count", [1, 2, 3])
+@pytest.mark.parametrize("skip, limit", [(0, 100), (0, 3), (2, 4), (5, 10), (11, 5), (20, 5)])
+def test_listado_ordenado_y_paginado_como_sin_sharding(api, skip, limit):
+    nombres = {}
+    for i in range(12):
+        personaje = api.post("/personajes/", json={"nombre": f"P{i}", "clase": "mago"}).json()
+        nombres[personaje["id"]] = personaje["nombre"]
+    # Sin sharding la tabla devuelve los personajes por id; con sharding los ids
+    # no son necesariamente consecutivos, pero el orden global tiene que ser el mismo
+    expected = sorted(nombres)[skip:skip + limit]
+    
+    response = api.get("/personajes/", params={"skip": skip, "limit": limit})
+    assert [personaje["id"] for personaje in response.json()] == expected
+    response = api.get("/personajes/", params={"skip": skip, "limit": limit, "fields": "nombre"})
+    assert [personaje["nombre"] for personaje in response.json()] == [nombres[pid] for pid in expected]
+
+@pytest.mark.parametrize("shard_count", [1, 2])
+def test_get_misiones_combina_shard_y_catalogo(database_dir, shard_count):
+    shards = ShardRouter()
+    personajes = [create(shards, f"P{i}") for i in range(shard_count)]
+    misiones = [
+        mision_repository.create(shards, MisionCreate(nombre=f"Mision {i}", descripcion="Mision de prueba", experiencia=10)).id
+        for i in range(2)
+    ]
+    for mision_id in misiones:
+        assert personaje_service.accept_mission(shards, personajes[-1], mision_id)
+    shards.close()
+    
+    # Sesiones nuevas: la misión tiene que venir del catálogo, no de la caché de la sesión
+    shards = ShardRouter()
+    asignaciones = repository.get_misiones(shards, personajes[-1])
+    assert sorted(asignacion.mision_id for asignacion in asignaciones) == misiones
+    assert sorted(asignacion.mision.nombre for asignacion in asignaciones) == ["Mision 0", "Mision 1"]
+    assert all(asignacion.mision.estado == "en_progreso" for asignacion in asignaciones)
+    assert repository.get_misiones(shards, personajes[0] if shard_count > 1 else 99) == []
+    shards.close()